@@ -18,6 +18,24 @@ import tensorflow as tf
 import numpy as np
 
 
+def _assign_ops(variables):
+    '''
+    Builds placeholders and assign ops to load numpy values into the variables
+    without adding new nodes to the graph at every call.
+    Also returns the shapes of the variables, to avoid querying them again.
+    '''
+    shapes = [tuple(v.get_shape().as_list()) for v in variables]
+    placeholders = [tf.placeholder(dtype=v.dtype.base_dtype, shape=v.get_shape()) for v in variables]
+    return placeholders, [v.assign(p) for v, p in zip(variables, placeholders)], shapes
+
+
+def _count_params(variables):
+    '''
+    Returns the total number of entries of the variables.
+    '''
+    return int(sum(np.prod(v.get_shape().as_list()) for v in variables))
+
+
 class MLP:
     '''
     Multi-layer perceptron.
@@ -35,17 +53,17 @@ class MLP:
                         last_out = tf.nn.dropout(last_out, keep_prob=keep_prob)
                 self.output.append(last_out)
         self.vars = tf.trainable_variables(scope=scope)
+        self._reset_ph, self._reset_op, self._reset_shape = _assign_ops(self.vars[-2:])
+        self._size = _count_params(self.vars)
 
 
     def reset(self, session, value=0.):
-        new_lin = tf.Variable(1e-8*(np.random.rand(self.vars[-2].shape[0],self.vars[-2].shape[1])-0.5),dtype=self.output[0].dtype) # set linear weights to ~0
-        new_bias = tf.Variable(value*np.ones(shape=self.vars[-1].shape),dtype=self.output[0].dtype) # set bias to desired value
-        session.run(tf.variables_initializer([new_lin, new_bias]))
-        session.run(self.vars[-2].assign(new_lin))
-        session.run(self.vars[-1].assign(new_bias))
+        new_lin = 1e-8*(np.random.rand(*self._reset_shape[0])-0.5) # set linear weights to ~0
+        new_bias = value*np.ones(shape=self._reset_shape[1]) # set bias to desired value
+        session.run(self._reset_op, dict(zip(self._reset_ph, [new_lin, new_bias])))
 
     def size(self):
-        return sum([np.prod(y) for y in [x.get_shape().as_list() for x in self.vars]])
+        return self._size
 
 
 class Quadratic:
@@ -59,23 +77,26 @@ class Quadratic:
             self.phi = []
             for i in x:
                 x_size = i.get_shape().as_list()[1]
-                last_out = tf.concat([1.0+0*i[:,:1], i], axis=1)
-                last_out = [last_out[:,k]*last_out[:,j] for k in range(x_size+1) for j in range(k,x_size+1)]
-                last_out = tf.stack(last_out,1)
+                triu = np.triu_indices(x_size+1) # same ordering as looping over k and j >= k
+                triu_idx = tf.constant(triu[0]*(x_size+1) + triu[1], dtype=tf.int32)
+                last_out = tf.pad(i, [[0,0],[1,0]], constant_values=1.)
+                last_out = tf.einsum('bi,bj->bij', last_out, last_out) # outer product
+                last_out = tf.reshape(last_out, [-1, (x_size+1)**2])
+                last_out = tf.gather(last_out, triu_idx, axis=1) # keep upper triangular entries
                 self.phi.append(last_out)
                 last_out = tf.layers.dense(last_out, size, activation=None, name=str(0), use_bias=False, reuse=tf.AUTO_REUSE)
                 self.output.append(last_out)
         self.vars = tf.trainable_variables(scope=scope)
+        self._reset_ph, self._reset_op, self._reset_shape = _assign_ops(self.vars[:1])
+        self._size = _count_params(self.vars)
 
     def reset(self, session, value=0.):
-        new_val = 1e-8*(np.random.rand(self.vars[0].shape[0],self.vars[0].shape[1])-0.5); # set linear+bias weights to 0
+        new_val = 1e-8*(np.random.rand(*self._reset_shape[0])-0.5); # set linear+bias weights to 0
         new_val[0] = value # set bias weight to desired value
-        new_vars = tf.Variable(new_val, dtype=self.output[0].dtype)
-        session.run(tf.variables_initializer([new_vars]))
-        session.run(self.vars[0].assign(new_vars))
+        session.run(self._reset_op, dict(zip(self._reset_ph, [new_val])))
 
     def size(self):
-        return sum([np.prod(y) for y in [x.get_shape().as_list() for x in self.vars]])
+        return self._size
 
 
 
@@ -94,21 +115,20 @@ class Linear:
                 last_out = tf.layers.dense(last_out, size, activation=None, name=str(0), use_bias=use_bias, reuse=tf.AUTO_REUSE)
                 self.output.append(last_out)
         self.vars = tf.trainable_variables(scope=scope)
+        self._reset_ph, self._reset_op, self._reset_shape = _assign_ops(self.vars[-2:]) # only the linear weights if there is no bias
+        self._size = _count_params(self.vars)
 
     def reset(self, session, value=0.):
-        if len(self.vars) == 2:
-            new_lin = tf.Variable(1e-8*(np.random.rand(self.vars[-2].shape[0],self.vars[-2].shape[1])-0.5),dtype=self.output[0].dtype) # set linear weights to ~0
-            new_bias = tf.Variable(value*np.ones(shape=self.vars[-1].shape),dtype=self.output[0].dtype) # set bias to desired value
-            session.run(tf.variables_initializer([new_lin, new_bias]))
-            session.run(self.vars[-2].assign(new_lin))
-            session.run(self.vars[-1].assign(new_bias))
+        if len(self._reset_shape) == 2:
+            new_lin = 1e-8*(np.random.rand(*self._reset_shape[0])-0.5) # set linear weights to ~0
+            new_bias = value*np.ones(shape=self._reset_shape[1]) # set bias to desired value
+            session.run(self._reset_op, dict(zip(self._reset_ph, [new_lin, new_bias])))
         else:
-            new_lin = tf.Variable(1e-8*(np.random.rand(self.vars[-1].shape[0],self.vars[-1].shape[1])-0.5),dtype=self.output[0].dtype)
-            session.run(tf.variables_initializer([new_lin]))
-            session.run(self.vars[-1].assign(new_lin))
+            new_lin = 1e-8*(np.random.rand(*self._reset_shape[0])-0.5)
+            session.run(self._reset_op, dict(zip(self._reset_ph, [new_lin])))
 
     def size(self):
-        return sum([np.prod(y) for y in [x.get_shape().as_list() for x in self.vars]])
+        return self._size
 
 
 
@@ -120,30 +140,31 @@ class Fourier:
     def __init__(self, x, size, n_feat, scope, bandwidth=0.3):
         self.name = 'fourier_approx_' + scope
         n_x = x[0].get_shape().as_list()[1]
-        self.P = tf.constant(np.random.normal(0., 1., (n_x, n_feat)), dtype=x[0].dtype)
+        P = np.random.normal(0., 1., (n_x, n_feat))
         self.shift = tf.constant(np.random.uniform(-np.pi, np.pi, (n_feat,)), dtype=x[0].dtype)
         self.bandwidth = bandwidth
+        self.P = tf.constant(P / np.reshape(bandwidth, (-1, 1)), dtype=x[0].dtype) # fold the bandwidth into the projection
 
         with tf.variable_scope(scope):
             theta = tf.Variable(tf.random_normal([n_feat+1,size], dtype=x[0].dtype))
             self.output = []
             self.phi = []
             for i in x:
-                phi = tf.sin(tf.matmul(i/self.bandwidth,self.P) + self.shift)
-                phi = tf.concat([1.0+0*i[:,:1], phi], axis=1) # add bias
+                phi = tf.sin(tf.matmul(i,self.P) + self.shift)
+                phi = tf.pad(phi, [[0,0],[1,0]], constant_values=1.) # add bias
                 self.phi.append(phi)
                 self.output.append(tf.matmul(phi, theta))
         self.vars = tf.trainable_variables(scope=scope)
+        self._reset_ph, self._reset_op, self._reset_shape = _assign_ops(self.vars[:1])
+        self._size = _count_params(self.vars)
 
     def reset(self, session, value=0.):
-        new_val = 1e-8*(np.random.rand(self.vars[0].shape[0],self.vars[0].shape[1])-0.5); # set linear+bias weights to 0
+        new_val = 1e-8*(np.random.rand(*self._reset_shape[0])-0.5); # set linear+bias weights to 0
         new_val[0] = value # set bias weight to desired value
-        new_vars = tf.Variable(new_val, dtype=self.output[0].dtype)
-        session.run(tf.variables_initializer([new_vars]))
-        session.run(self.vars[0].assign(new_vars))
+        session.run(self._reset_op, dict(zip(self._reset_ph, [new_val])))
 
     def size(self):
-        return sum([np.prod(y) for y in [x.get_shape().as_list() for x in self.vars]])
+        return self._size
 
 
 
@@ -159,33 +180,36 @@ class RBF:
         n_x = x[0].get_shape().as_list()[1]
         self.B = np.sqrt(n_centers**2 / np.diff(x_space)**2).T # bandwiths
         m = np.diff(x_space) / n_centers
-        tmp = []
-        for i in range(n_x): # automatically place centers
-            tmp.append(np.linspace(-m[i]*0.1+x_space[i][0], x_space[i][1]+m[i]*0.1, n_centers))
-        tmp = np.meshgrid(*tmp)
-        self.centers = np.zeros((n_centers**n_x, n_x))
-        for i in range(n_x):
-            self.centers[:,i] = tmp[i].flatten()
+        axes = [np.linspace(-m[i]*0.1+x_space[i][0], x_space[i][1]+m[i]*0.1, n_centers) for i in range(n_x)] # automatically place centers
+        self.centers = np.stack(np.meshgrid(*axes), axis=-1).reshape(-1, n_x)
+
+        # Constants are built once and shared by all inputs
+        cB = self.centers * self.B
+        self.B_const = tf.constant(self.B, dtype=x[0].dtype)
+        self.cBT = tf.constant(np.ascontiguousarray(cB.T), dtype=x[0].dtype) # [n_x, n_centers**n_x]
+        self.c_sq = tf.constant(np.sum(cB**2, axis=1)[None], dtype=x[0].dtype) # [1, n_centers**n_x]
 
         with tf.variable_scope(scope):
             theta = tf.Variable(tf.random_normal([self.centers.shape[0]+1,size], dtype=x[0].dtype))
             self.output = []
             self.phi = []
-            cB = self.centers * self.B
             for i in x:
-                xB = i * self.B
-                phi = tf.exp(-tf.reduce_sum((tf.expand_dims(xB, axis=2) - np.expand_dims(cB.T, axis=0))**2, axis=1))
-                phi = tf.concat([1.0+0*i[:,:1], phi], axis=1) # add bias
+                xB = i * self.B_const
+                # ||x-c||^2 = ||x||^2 - 2*x'c + ||c||^2, to avoid building a [batch, n_x, n_centers] tensor
+                x_sq = tf.reduce_sum(xB*xB, axis=1, keepdims=True)
+                d_sq = x_sq - 2.*tf.einsum('bi,ic->bc', xB, self.cBT) + self.c_sq
+                phi = tf.exp(-d_sq)
+                phi = tf.pad(phi, [[0,0],[1,0]], constant_values=1.) # add bias
                 self.phi.append(phi)
                 self.output.append(tf.matmul(phi, theta))
         self.vars = tf.trainable_variables(scope=scope)
+        self._reset_ph, self._reset_op, self._reset_shape = _assign_ops(self.vars[:1])
+        self._size = _count_params(self.vars)
 
     def reset(self, session, value=0.):
-        new_val = 1e-8*(np.random.rand(self.vars[0].shape[0],self.vars[0].shape[1])-0.5); # set linear+bias weights to 0
+        new_val = 1e-8*(np.random.rand(*self._reset_shape[0])-0.5); # set linear+bias weights to 0
         new_val[0] = value # set bias weight to desired value
-        new_vars = tf.Variable(new_val, dtype=self.output[0].dtype)
-        session.run(tf.variables_initializer([new_vars]))
-        session.run(self.vars[0].assign(new_vars))
+        session.run(self._reset_op, dict(zip(self._reset_ph, [new_val])))
 
     def size(self):
-        return sum([np.prod(y) for y in [x.get_shape().as_list() for x in self.vars]])
+        return self._size
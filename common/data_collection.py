@@ -25,9 +25,11 @@ def rollout(env, policy, max_trans_per_ep=np.inf, clip_act=True, render=False):
         obs = nobs
 
 
-def collect_samples(env, policy, min_trans, max_trans_per_ep=np.inf, clip_act=True, render=False):
+def collect_samples(env, policy, min_trans, max_trans_per_ep=np.inf, clip_act=True, render=False, dtype=None):
     '''
     Keeps calling rollout and saving the resulting path until at least min_trans transitions are collected.
+    If DTYPE is given, observations, actions and rewards are stored as contiguous arrays of that type
+    (e.g., the precision of the placeholders, so that they are not converted at every feed).
     Returns the following data (everything is a 2D array):
     - obs      : observation of current state
     - nobs     : observation of next state
@@ -65,6 +67,9 @@ def collect_samples(env, policy, min_trans, max_trans_per_ep=np.inf, clip_act=Tr
     paths["rwd"] = np.atleast_2d(paths["rwd"])
     paths["done"] = np.atleast_2d(paths["done"])
     paths["iobs"] = np.atleast_2d(paths["iobs"])
+    if dtype is not None:
+        for key in ["obs", "nobs", "act", "rwd", "iobs"]:
+            paths[key] = np.ascontiguousarray(paths[key], dtype=dtype)
     return paths
 
 
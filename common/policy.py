@@ -22,8 +22,10 @@ class MVNPolicy:
     '''
     Gaussian policy with diagonal covariance. The mean and the std can be any
     kind of tensor (a MLP depending on the state, a simple tensor, or a fixed constant).
+    The action used to compute log-probabilities is a new placeholder, unless
+    ACT is given (e.g., a placeholder_with_default reading from a tf.data iterator).
     '''
-    def __init__(self, session, obs, mean, std, name='pi', act_bound=np.inf):
+    def __init__(self, session, obs, mean, std, name='pi', act_bound=np.inf, act=None):
         self.session = session
         self.name = 'mvn_policy_' + name
         self.obs = obs
@@ -42,7 +44,9 @@ class MVNPolicy:
         self.entropy = tf.reduce_mean(self.act_dist.entropy())
         # self.entropy = 0.5 * tf.reduce_mean(self.act_size * (np.log(2.*np.pi) + 1.) + 2.*tf.reduce_sum(tf.log(self.std), axis=1))
 
-        self.act = tf.placeholder(dtype=obs.dtype, shape=[None, self.act_size], name=name+'_act')
+        if act is None:
+            act = tf.placeholder(dtype=obs.dtype, shape=[None, self.act_size], name=name+'_act')
+        self.act = act
         self.log_prob = tf.expand_dims(self.act_dist.log_prob(self.act), axis=-1) # expand vector returned by log_prob to row vector
         # self.log_prob = -0.5*tf.reduce_sum((self.mean - self.act)**2 / self.std**2 + 2.*tf.reduce_sum(tf.log(self.std)) + self.act_size*np.log(2.*np.pi), axis=1, keepdims=True)
 
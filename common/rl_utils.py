@@ -1,4 +1,9 @@
 import numpy as np
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs): # numba is optional, without it loops run as plain python
+        return lambda f: f
 
 
 def mc_ret(paths, gamma):
@@ -28,12 +33,36 @@ def gae(paths, v_values, gamma, lambda_trace, prob_ratio=[]):
     https://arxiv.org/abs/1606.02647
     '''
 
+    return gae_td(paths, v_values, gamma, lambda_trace, prob_ratio)[0]
+
+
+def gae_td(paths, v_values, gamma, lambda_trace, prob_ratio=[]):
+    '''
+    Same as gae, but also returns the TD errors (i.e., gae with lambda_trace = 0)
+    computed during the same backward pass.
+    '''
+    done = np.ravel(paths["done"])
+    if not done[-1]: # the compiled recursion does not check bounds
+        raise ValueError('The last transition must be terminal.')
     if len(prob_ratio) == 0:
         prob_ratio = np.ones(v_values.shape)
+    a_values, td_values = _gae_kernel(np.ravel(paths["rwd"]), done, np.ravel(v_values), np.ravel(prob_ratio), gamma, lambda_trace)
+    return a_values.reshape(v_values.shape), td_values.reshape(v_values.shape)
+
+
+@njit(cache=True)
+def _gae_kernel(rwd, done, v_values, prob_ratio, gamma, lambda_trace):
+    '''
+    Backward recursion of GAE over flat arrays (compiled with numba, if available).
+    '''
     a_values = np.empty_like(v_values)
-    for k in reversed(range(len(v_values))):
-        if paths["done"][k]:
-            a_values[k] = prob_ratio[k] * (paths["rwd"][k] - v_values[k])
+    td_values = np.empty_like(v_values)
+    for k in range(len(v_values) - 1, -1, -1):
+        if done[k]:
+            td_values[k] = prob_ratio[k] * (rwd[k] - v_values[k])
+            a_values[k] = td_values[k]
         else:
-            a_values[k] = prob_ratio[k] * (paths["rwd"][k] + gamma * v_values[k + 1] - v_values[k] + gamma * lambda_trace * a_values[k + 1])
-    return a_values
+            delta = rwd[k] + gamma * v_values[k + 1] - v_values[k]
+            td_values[k] = prob_ratio[k] * delta
+            a_values[k] = prob_ratio[k] * (delta + gamma * lambda_trace * a_values[k + 1])
+    return a_values, td_values
@@ -14,6 +14,7 @@ lambda_trace       = 0.95       # coefficient for generalized advantage
 e_clip             = 0.05       # the 'step size'
 std_noise          = 2.         # Gaussian policy std
 filter_env         = False      # True to normalize actions and states to [-1,1]
+xla_jit            = True       # True to let XLA fuse the graph into compiled clusters (ignored with float64)
 pi_activations     = [tf.nn.tanh, tf.nn.tanh]
 v_activations      = [tf.nn.tanh, tf.nn.tanh]
 v_sizes            = [64, 64]
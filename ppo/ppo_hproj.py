@@ -37,6 +37,8 @@ def main(env_name, seed=1, run_name=None):
 
     config_tf = tf.ConfigProto()
     config_tf.gpu_options.allow_growth=True
+    if xla_jit and precision != tf.float64: # XLA can be slower than plain kernels with FP64
+        config_tf.graph_options.optimizer_options.global_jit_level = tf.OptimizerOptions.ON_1
     session = tf.Session(config=config_tf)
 
     # Init placeholders
@@ -44,11 +46,24 @@ def main(env_name, seed=1, run_name=None):
     act_size = env.action_space.shape[0]
     obs = tf.placeholder(dtype=precision, shape=[None, obs_size], name='obs')
 
+    # Dataset for the pi update: data is fed once per iteration and then consumed in mini-batches for all epochs
+    # (shuffling before repeat gives a new permutation at every epoch, the seed is fed to change them at every iteration)
+    obs_data = tf.placeholder(dtype=precision, shape=[None, obs_size], name='obs_data')
+    act_data = tf.placeholder(dtype=precision, shape=[None, act_size], name='act_data')
+    old_log_probs_data = tf.placeholder(dtype=precision, shape=[None, 1], name='old_log_probs_data')
+    advantage_data = tf.placeholder(dtype=precision, shape=[None, 1], name='advantage_data')
+    nb_trans_data = tf.placeholder(dtype=tf.int64, shape=[], name='nb_trans_data')
+    shuffle_seed = tf.placeholder(dtype=tf.int64, shape=[], name='shuffle_seed')
+    dataset = tf.data.Dataset.from_tensor_slices((obs_data, act_data, old_log_probs_data, advantage_data))
+    dataset = dataset.shuffle(nb_trans_data, seed=shuffle_seed).batch(batch_size).repeat(epochs_pi).prefetch(1)
+    iterator = dataset.make_initializable_iterator()
+    obs_batch, act_batch, old_log_probs_batch, advantage_batch = iterator.get_next()
+
     # Build pi
     beta_lin = 0.1
     act_bound = env.action_space.high
     assert np.all(act_bound == -env.action_space.low)
-    mean = MLP([obs], pi_sizes+[act_size], pi_activations+[None], 'pi_mean')
+    mean = MLP([obs, obs_batch], pi_sizes+[act_size], pi_activations+[None], 'pi_mean') # output[1] is the mean of the dataset mini-batch
     with tf.variable_scope('pi_std'):
         l = tf.Variable(std_noise * tf.ones([1, act_size], dtype=precision), dtype=precision)
         beta = tf.Variable(0.5 * act_size * np.log(2.*np.pi*np.e) + act_size*(np.log(std_noise)), dtype=precision, name='target_ent', trainable=False)
@@ -56,6 +71,7 @@ def main(env_name, seed=1, run_name=None):
         # std = tf.exp(tf.log(l) - h / act_size) # equality constraint
         std = tf.exp(tf.maximum(tf.log(l), tf.log(l) - h / act_size)) # inequality constraint
     pi = MVNPolicy(session, obs, mean.output[0], std, act_bound=act_bound)
+    pi_batch = MVNPolicy(session, obs_batch, mean.output[1], std, name='pi_batch', act_bound=act_bound, act=act_batch) # same policy, on the dataset mini-batch
 
     # Build V
     v = MLP([obs], v_sizes+[1], v_activations+[None], 'v')
@@ -68,10 +84,21 @@ def main(env_name, seed=1, run_name=None):
     # pi optimization
     advantage = tf.placeholder(dtype=precision, shape=[None, 1], name='advantage')
     old_log_probs = tf.placeholder(dtype=precision, shape=[None, 1], name='old_log_probs')
-    prob_ratio = tf.exp(pi.log_prob - old_log_probs)
-    clip_pr = tf.clip_by_value(prob_ratio, 1.-e_clip, 1.+e_clip)
-    loss_pi = -tf.reduce_mean(tf.minimum(tf.multiply(prob_ratio, advantage), tf.multiply(clip_pr, advantage)))
-    optimize_pi = tf.train.AdamOptimizer(lrate_pi).minimize(loss_pi)
+    def clipped_loss(log_probs, old_log_probs, advantage):
+        # min(ratio*A, clip(ratio)*A) is min(ratio,1+e)*A if A > 0, and max(ratio,1-e)*A otherwise: clip in log-space before exp
+        log_ratio = log_probs - old_log_probs
+        clip_log_ratio = tf.where(advantage > 0., tf.minimum(log_ratio, np.log(1.+e_clip)), tf.maximum(log_ratio, np.log(1.-e_clip)))
+        return -tf.reduce_mean(tf.multiply(tf.exp(clip_log_ratio), advantage))
+    loss_pi = clipped_loss(pi.log_prob, old_log_probs, advantage) # on fed data, for logging
+    loss_pi_batch = clipped_loss(pi_batch.log_prob, old_log_probs_batch, advantage_batch) # on the dataset mini-batch, for training
+    optimize_pi = tf.train.AdamOptimizer(lrate_pi).minimize(loss_pi_batch)
+
+    # Compiled training steps (skip feed_dict parsing and graph pruning at every call)
+    train_v_step = session.make_callable(optimize_v, [obs, target_v])
+    eval_v_and_loss = session.make_callable([v.output[0], loss_v], [obs, target_v])
+    init_pi_data = session.make_callable(iterator.initializer, [obs_data, act_data, old_log_probs_data, advantage_data, nb_trans_data, shuffle_seed])
+    train_pi_step = session.make_callable(optimize_pi) # nothing to feed, mini-batches come from the iterator
+    eval_loss_pi = session.make_callable(loss_pi, [obs, pi.act, old_log_probs, advantage])
 
 
 
@@ -82,49 +109,58 @@ def main(env_name, seed=1, run_name=None):
 
 
 
+    # Mini-batch buffers for the V update, reused at every step
+    obs_buf = np.empty((batch_size, obs_size), dtype=precision.as_numpy_dtype)
+    target_buf = np.empty((batch_size, 1), dtype=precision.as_numpy_dtype)
+
+
+
     logger = LoggerData('ppo_hproj', env_name, run_name)
     print()
     print('    V LOSS                         PI LOSS                        ENTROPY        RETURN          MSTDE')
     for itr in range(maxiter):
-        paths = collect_samples(env, policy=pi.draw_action, min_trans=min_trans_per_iter)
+        paths = collect_samples(env, policy=pi.draw_action, min_trans=min_trans_per_iter, dtype=precision.as_numpy_dtype)
         nb_trans = len(paths["rwd"])
 
         # Update V
+        perm = np.arange(nb_trans)
         for epoch in range(epochs_v):
             v_values = session.run(v.output[0], {obs: paths["obs"]})
             a_values = gae(paths, v_values, gamma, lambda_trace) # compute the advantage
             target_values = v_values + a_values # generalized Bellman operator
             if epoch == 0:
-                v_loss_before = session.run(loss_v, {obs: paths["obs"], target_v: target_values})
-            for batch_idx in minibatch_idx_list(batch_size, nb_trans):
-                session.run(optimize_v, {obs: paths["obs"][batch_idx], target_v: target_values[batch_idx]})
-        v_loss_after = session.run(loss_v, {obs: paths["obs"], target_v: target_values})
-
-        # Estimate advantages and TD error
-        v_values = session.run(v.output[0], {obs: paths["obs"]})
-        a_values = gae(paths, v_values, gamma, lambda_trace)
-        td_values = gae(paths, v_values, gamma, 0)
+                v_loss_before = np.mean(a_values**2) # loss_v with the V values just computed, without running V again
+            np.random.shuffle(perm)
+            for batch_start in range(0, nb_trans, batch_size):
+                batch_idx = perm[batch_start:batch_start+batch_size]
+                n = len(batch_idx) # the last mini-batch can be smaller
+                np.take(paths["obs"], batch_idx, axis=0, out=obs_buf[:n], mode='clip') # 'clip' avoids the extra buffering of 'raise', indices are valid anyway
+                np.take(target_values, batch_idx, axis=0, out=target_buf[:n], mode='clip')
+                train_v_step(obs_buf[:n], target_buf[:n])
+
+        # Estimate advantages and TD error (V is evaluated once for both the new values and its loss)
+        v_values, v_loss_after = eval_v_and_loss(paths["obs"], target_values)
+        a_values, td_values = gae_td(paths, v_values, gamma, lambda_trace)
         mstde = np.mean(td_values**2)
 
-        a_values = (a_values - np.mean(a_values)) / np.std(a_values)
+        a_values = np.ascontiguousarray(a_values, dtype=precision.as_numpy_dtype)
+        a_values -= np.mean(a_values) # standardize in-place
+        a_values /= np.std(a_values) + 1e-8
 
 
 
 
         # Udpate pi
         old_lp = pi.get_log_prob(paths["obs"], paths["act"])
-        pi_loss_before = session.run(loss_pi, {obs: paths["obs"], pi.act: paths["act"], old_log_probs: old_lp, advantage: a_values})
+        pi_loss_before = eval_loss_pi(paths["obs"], paths["act"], old_lp, a_values)
         beta.load(pi.estimate_entropy(paths["obs"]) - beta_lin, session)
-        for epoch in range(epochs_pi):
-            for batch_idx in minibatch_idx_list(batch_size, nb_trans):
-                dct_pi = {obs: paths["obs"][batch_idx],
-                            pi.act: paths["act"][batch_idx],
-                            old_log_probs: old_lp[batch_idx],
-                            advantage: a_values[batch_idx]}
-
-
-                session.run(optimize_pi, dct_pi)
-        pi_loss_after = session.run(loss_pi, {obs: paths["obs"], pi.act: paths["act"], old_log_probs: old_lp, advantage: a_values})
+        init_pi_data(paths["obs"], paths["act"], old_lp, a_values, nb_trans, np.random.randint(2**31))
+        while True:
+            try:
+                train_pi_step()
+            except tf.errors.OutOfRangeError:
+                break
+        pi_loss_after = eval_loss_pi(paths["obs"], paths["act"], old_lp, a_values)
 
 
 